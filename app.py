@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
+import io
+import itertools
+import plotly.graph_objects as go
 import os
 from datetime import datetime
+from PIL import Image
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 from auth import get_authenticator
 from database import create_table, get_connection
@@ -21,7 +30,9 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # -------------------------------------------------
 # GLOBAL DARK UI
 # -------------------------------------------------
-st.markdown("""
+@st.cache_data
+def _css():
+    return """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
 html, body, [class*="css"] {
@@ -35,7 +46,20 @@ html, body, [class*="css"] {
     box-shadow: 0 6px 20px rgba(0,0,0,0.4);
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+st.markdown(_css(), unsafe_allow_html=True)
+
+# -------------------------------------------------
+# CACHED RESOURCES (BUILT ONCE PER PROCESS)
+# -------------------------------------------------
+@st.cache_resource
+def _pool():
+    conn = get_connection()
+    create_table()
+    return conn
+
 
 # -------------------------------------------------
 # LOGIN
@@ -60,9 +84,80 @@ st.sidebar.markdown("## 📘 Trade Journal")
 page = st.sidebar.radio("Navigate", ["Dashboard", "Trades", "Analytics"])
 
 # -------------------------------------------------
-# DATABASE INIT
+# LOAD TRADES (CACHED ACROSS RERUNS)
+# -------------------------------------------------
+def _trades_version(username):
+    # cheap token that changes whenever the user's trades do
+    return _pool().execute(
+        "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM trades WHERE username = ?",
+        (username,)
+    ).fetchone()
+
+
+def _fetch_df(conn, sql, params):
+    # skips pandas' read_sql fallback path and its dtype inference
+    cur = conn.execute(sql, params)
+    return pd.DataFrame.from_records(
+        cur.fetchall(),
+        columns=[d[0] for d in cur.description]
+    )
+
+
+def tighten(df):
+    num_cols = ["entry", "stoploss", "takeprofit", "lot",
+                "pnl", "risk", "reward", "rr"]
+    df[num_cols] = df[num_cols].astype("float32")
+    df["pair"] = df["pair"].astype("category")
+    df["direction"] = df["direction"].astype("category")
+    # signed direction (+1 Buy, -1 Sell) so long/short aggregates
+    # never need a per-row string compare
+    df["_sign"] = np.where(df["direction"] == "Buy",
+                           np.int8(1), np.int8(-1))
+    return df
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_trades(username, version):
+    # no screenshot/notes: the review fragment point-looks those up
+    df = _fetch_df(
+        _pool(),
+        """
+        SELECT id, pair, direction, entry, stoploss, takeprofit, lot,
+               created_at, pnl, risk, reward, rr
+        FROM trades WHERE username = ?
+        ORDER BY id
+        """,
+        (username,)
+    )
+    return tighten(df)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_pnl(username, version):
+    cur = _pool().execute(
+        "SELECT pnl FROM trades WHERE username = ? ORDER BY id",
+        (username,)
+    )
+    return np.fromiter((r[0] for r in cur), dtype=np.float64)
+
+
+# -------------------------------------------------
+# DASHBOARD METRICS (AGGREGATED IN SQL)
 # -------------------------------------------------
-create_table()
+@st.cache_data(ttl=300, show_spinner=False)
+def load_metrics(username, version):
+    return _pool().execute(
+        """
+        SELECT
+            COUNT(*),
+            SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END),
+            AVG(rr),
+            SUM(pnl)
+        FROM trades WHERE username = ?
+        """,
+        (username,)
+    ).fetchone()
+
 
 # -------------------------------------------------
 # CSV IMPORT WITH COLUMN MAPPING
@@ -70,53 +165,101 @@ create_table()
 st.sidebar.markdown("### 📥 Import CSV")
 uploaded_file = st.sidebar.file_uploader("Upload CSV", type=["csv"])
 
-if uploaded_file is not None:
-    csv_df = pd.read_csv(uploaded_file)
+# fragment: remapping columns or importing only reruns this block,
+# not the whole script
+@st.fragment
+def render_csv_import(csv_bytes):
+    # only parse the first rows for the preview / mapping UI;
+    # the full file is read once the user actually imports
+    preview_df = pd.read_csv(io.BytesIO(csv_bytes), nrows=200)
 
     st.subheader("CSV Preview")
-    st.dataframe(csv_df.head(), use_container_width=True)
+    st.dataframe(preview_df.head(), use_container_width=True)
 
     st.markdown("### 🧩 Map CSV Columns")
-    pair_col = st.selectbox("Pair", csv_df.columns)
-    direction_col = st.selectbox("Direction", csv_df.columns)
-    entry_col = st.selectbox("Entry", csv_df.columns)
-    stoploss_col = st.selectbox("Stoploss", csv_df.columns)
-    takeprofit_col = st.selectbox("Takeprofit", csv_df.columns)
-    lot_col = st.selectbox("Lot", csv_df.columns)
+    pair_col = st.selectbox("Pair", preview_df.columns)
+    direction_col = st.selectbox("Direction", preview_df.columns)
+    entry_col = st.selectbox("Entry", preview_df.columns)
+    stoploss_col = st.selectbox("Stoploss", preview_df.columns)
+    takeprofit_col = st.selectbox("Takeprofit", preview_df.columns)
+    lot_col = st.selectbox("Lot", preview_df.columns)
 
     if st.button("🚀 Import Trades"):
-        conn = get_connection()
-        imported, skipped = 0, 0
+        mapped = list(dict.fromkeys([pair_col, direction_col, entry_col,
+                                     stoploss_col, takeprofit_col, lot_col]))
+
+        # the vectorized cleaning assumes one CSV column per field;
+        # duplicate labels would select a sub-DataFrame and crash
+        if len(mapped) < 6:
+            st.error("Each field must be mapped to a different CSV column")
+            return
+
+        def _clean(chunk):
+            cols = chunk[[pair_col, direction_col, entry_col,
+                          stoploss_col, takeprofit_col, lot_col]].copy()
+
+            cols[pair_col] = cols[pair_col].astype(str)
+            cols[direction_col] = cols[direction_col].astype(str).str.capitalize()
 
-        for _, row in csv_df.iterrows():
+            num_cols = [entry_col, stoploss_col, takeprofit_col, lot_col]
+            cols[num_cols] = cols[num_cols].apply(pd.to_numeric, errors="coerce")
+            cols[[stoploss_col, takeprofit_col]] = cols[[stoploss_col, takeprofit_col]].fillna(0)
+
+            valid = cols[entry_col].notna() & cols[lot_col].notna()
+            return cols[valid], int((~valid).sum())
+
+        if len(csv_bytes) > 8_000_000:
+            # stream big broker exports so peak memory stays flat
+            chunks = pd.read_csv(io.BytesIO(csv_bytes), usecols=mapped,
+                                 chunksize=20_000)
+        else:
             try:
-                conn.execute(
+                # arrow's multi-threaded reader skips the inference pass
+                chunks = [pd.read_csv(io.BytesIO(csv_bytes), usecols=mapped,
+                                      engine="pyarrow")]
+            except (ImportError, ValueError):
+                chunks = [pd.read_csv(io.BytesIO(csv_bytes), usecols=mapped)]
+
+        imported, skipped = 0, 0
+        conn = _pool()
+
+        with conn:
+            for chunk in chunks:
+                cols, bad = _clean(chunk)
+                skipped += bad
+
+                # .tolist() converts each column to Python objects in
+                # one C loop, so executemany never touches pandas rows
+                rows = zip(
+                    itertools.repeat(username),
+                    cols[pair_col].tolist(),
+                    cols[direction_col].tolist(),
+                    cols[entry_col].tolist(),
+                    cols[stoploss_col].tolist(),
+                    cols[takeprofit_col].tolist(),
+                    cols[lot_col].tolist(),
+                )
+                conn.executemany(
                     """
                     INSERT INTO trades
                     (username, pair, direction, entry, stoploss, takeprofit, lot)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                     """,
-                    (
-                        username,
-                        str(row[pair_col]),
-                        str(row[direction_col]).capitalize(),
-                        float(row[entry_col]),
-                        float(row[stoploss_col]) if pd.notna(row[stoploss_col]) else 0,
-                        float(row[takeprofit_col]) if pd.notna(row[takeprofit_col]) else 0,
-                        float(row[lot_col])
-                    )
+                    rows
                 )
-                imported += 1
-            except Exception:
-                skipped += 1
-
-        conn.commit()
-        conn.close()
+                imported += len(cols)
 
+        load_trades.clear()
+        load_pnl.clear()
+        load_metrics.clear()
         st.success(f"Imported {imported} trades")
         if skipped:
             st.warning(f"Skipped {skipped} rows")
-        st.rerun()
+        st.rerun(scope="app")
+
+
+if uploaded_file is not None:
+    render_csv_import(uploaded_file.getvalue())
 
 # -------------------------------------------------
 # MANUAL ADD TRADE
@@ -137,85 +280,115 @@ with st.expander("➕ Add Trade"):
         submit = st.form_submit_button("Save Trade")
 
     if submit:
-        conn = get_connection()
-        conn.execute(
-            """
-            INSERT INTO trades
-            (username, pair, direction, entry, stoploss, takeprofit, lot)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (username, pair, direction, entry, stoploss, takeprofit, lot)
-        )
-        conn.commit()
-        conn.close()
+        conn = _pool()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO trades
+                (username, pair, direction, entry, stoploss, takeprofit, lot)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (username, pair, direction, entry, stoploss, takeprofit, lot)
+            )
+        load_trades.clear()
+        load_pnl.clear()
+        load_metrics.clear()
         st.success("Trade saved")
         st.rerun()
 
 # -------------------------------------------------
-# LOAD TRADES
+# PER-PAGE DATA FETCH
 # -------------------------------------------------
-conn = get_connection()
-df = pd.read_sql(
-    "SELECT * FROM trades WHERE username = ?",
-    conn,
-    params=(username,)
-)
-conn.close()
+version = _trades_version(username)
 
-if df.empty:
-    st.info("No trades yet")
-    st.stop()
+if page == "Dashboard":
+    # the dashboard only needs the PnL series, not the full frame
+    pnl = load_pnl(username, version)
 
-# -------------------------------------------------
-# CALCULATIONS (FIXED)
-# -------------------------------------------------
-df["PnL"] = df.apply(
-    lambda r:
-    (r["takeprofit"] - r["entry"]) * r["lot"]
-    if r["direction"] == "Buy"
-    else (r["entry"] - r["takeprofit"]) * r["lot"],
-    axis=1
-)
+    if pnl.size == 0:
+        st.info("No trades yet")
+        st.stop()
+else:
+    df = load_trades(username, version)
 
-df["Risk"] = (df["entry"] - df["stoploss"]).abs() * df["lot"]
-df["Reward"] = (df["takeprofit"] - df["entry"]).abs() * df["lot"]
-df["RR"] = (df["Reward"] / df["Risk"]).round(2)
+    if df.empty:
+        st.info("No trades yet")
+        st.stop()
 
-df["Equity"] = df["PnL"].cumsum()
-df["Peak"] = df["Equity"].cummax()
-df["Drawdown"] = df["Equity"] - df["Peak"]
+    df = df.rename(columns={"pnl": "PnL", "risk": "Risk",
+                            "reward": "Reward", "rr": "RR"})
+    pnl = df["PnL"].to_numpy(dtype=np.float64)
 
 # -------------------------------------------------
-# DASHBOARD
+# CALCULATIONS (PnL/Risk/Reward/RR COME FROM SQLITE)
 # -------------------------------------------------
-if page == "Dashboard":
-    st.markdown("## Dashboard")
-
-    c1,c2,c3,c4,c5 = st.columns(5)
-    c1.metric("Trades", len(df))
-    c2.metric("Win Rate", f"{round((df['PnL']>0).mean()*100,2)}%")
-    c3.metric("Avg RR", round(df["RR"].mean(),2))
-    c4.metric("Max DD", round(df["Drawdown"].min(),2))
-    c5.metric("Net PnL", round(df["PnL"].sum(),2))
+if njit is not None:
+    @njit(cache=True)
+    def _equity_drawdown(pnl):
+        n = pnl.size
+        eq = np.empty(n)
+        dd = np.empty(n)
+        s = 0.0
+        p = -np.inf
+        for i in range(n):
+            s += pnl[i]
+            if s > p:
+                p = s
+            eq[i] = s
+            dd[i] = s - p
+        return eq, dd
+
+    # one pass over pnl instead of cumsum + cummax + subtract
+    equity, drawdown = _equity_drawdown(pnl)
+    peak = equity - drawdown
+else:
+    equity = np.cumsum(pnl)
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity - peak
+
+if page != "Dashboard":
+    df = df.assign(Equity=equity, Peak=peak, Drawdown=drawdown)
 
-    fig = px.line(df, y="Equity")
-    fig.update_traces(line=dict(width=3, color="#58a6ff"))
+# -------------------------------------------------
+# FIGURES (CACHED ON THE SERIES BYTES)
+# -------------------------------------------------
+@st.cache_data(show_spinner=False)
+def _equity_fig(equity_bytes):
+    equity = np.frombuffer(equity_bytes)
+    # WebGL trace: SVG rendering chokes on multi-thousand-point journals
+    fig = go.Figure(go.Scattergl(
+        y=equity,
+        mode="lines",
+        line=dict(width=3, color="#58a6ff")
+    ))
     fig.update_layout(
         plot_bgcolor="#0e1117",
         paper_bgcolor="#0e1117",
         font_color="#c9d1d9",
         xaxis=dict(showgrid=False, showticklabels=False),
-        yaxis=dict(gridcolor="#21262d")
+        yaxis=dict(gridcolor="#21262d"),
+        uirevision="equity"
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_dict()
 
-# -------------------------------------------------
-# TRADES + SCREENSHOT UPLOAD
-# -------------------------------------------------
-elif page == "Trades":
-    st.markdown("## Trades")
-    st.dataframe(df, use_container_width=True)
 
+@st.cache_data(show_spinner=False)
+def _drawdown_fig(dd_bytes):
+    dd = np.frombuffer(dd_bytes)
+    fig = go.Figure(go.Scattergl(y=dd, mode="lines", fill="tozeroy"))
+    fig.update_layout(
+        plot_bgcolor="#0e1117",
+        paper_bgcolor="#0e1117",
+        font_color="#c9d1d9",
+        uirevision="drawdown"
+    )
+    return fig.to_dict()
+
+
+# fragment: picking a trade or typing notes only reruns the review
+# block, not the data load and charts above it
+@st.fragment
+def render_screenshot_review(df):
     st.markdown("## 📸 Screenshot Review")
 
     trade_id = st.selectbox("Select Trade ID", df["id"].tolist())
@@ -226,38 +399,137 @@ elif page == "Trades":
         if uploaded_img is None:
             st.error("Please upload an image")
         else:
-            filename = f"{username}_{trade_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.png"
+            # keep the original format instead of mislabelling
+            # everything .png
+            ext = os.path.splitext(uploaded_img.name)[1].lower() or ".png"
+            filename = f"{username}_{trade_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{ext}"
             filepath = os.path.join(UPLOAD_DIR, filename)
 
-            with open(filepath, "wb") as f:
-                f.write(uploaded_img.getbuffer())
-
-            conn = get_connection()
-            conn.execute(
-                "UPDATE trades SET screenshot = ?, notes = ? WHERE id = ?",
-                (filepath, notes, trade_id)
-            )
-            conn.commit()
-            conn.close()
+            buf = uploaded_img.getbuffer()
+            if ext == ".png" and buf.nbytes > 500_000:
+                # big PNGs: downscale + recompress before they hit
+                # disk and every later st.image render
+                img = Image.open(uploaded_img)
+                img.thumbnail((1600, 1600))
+                img.save(filepath, optimize=True)
+            else:
+                with open(filepath, "wb") as f:
+                    f.write(buf)
+
+            conn = _pool()
+            with conn:
+                conn.execute(
+                    "UPDATE trades SET screenshot = ?, notes = ? WHERE id = ?",
+                    (filepath, notes, trade_id)
+                )
 
+            load_trades.clear()
             st.success("Screenshot saved")
-            st.rerun()
+            st.rerun(scope="app")
+
+    screenshot, review_notes = _pool().execute(
+        "SELECT screenshot, notes FROM trades WHERE id = ?",
+        (trade_id,)
+    ).fetchone()
+    if screenshot:
+        st.image(screenshot, use_column_width=True)
+    if review_notes:
+        st.info(review_notes)
+
+
+# -------------------------------------------------
+# DASHBOARD
+# -------------------------------------------------
+if page == "Dashboard":
+    st.markdown("## Dashboard")
+
+    total, wins, avg_rr, net_pnl = load_metrics(username, version)
+
+    def _card(title, value):
+        return (
+            "<div class='card'>"
+            f"<div style='color:#8b949e;font-size:14px'>{title}</div>"
+            f"<div style='color:#c9d1d9;font-size:26px;font-weight:700'>{value}</div>"
+            "</div>"
+        )
+
+    cards = [
+        ("Trades", total),
+        ("Win Rate", f"{round(wins/total*100,2)}%"),
+        ("Avg RR", round(avg_rr,2)),
+        ("Max DD", round(drawdown.min(),2)),
+        ("Net PnL", round(net_pnl,2)),
+    ]
+
+    # one markdown element instead of five columns + five metrics
+    st.markdown(
+        "<div style='display:grid;grid-template-columns:repeat(5,1fr);gap:16px'>"
+        + "".join(_card(t, v) for t, v in cards)
+        + "</div>",
+        unsafe_allow_html=True
+    )
+
+    # build the Figure object once per session; reruns only swap the
+    # y-array in place (uirevision keeps the browser-side view state)
+    if "equity_fig" not in st.session_state:
+        st.session_state["equity_fig"] = go.Figure(_equity_fig(equity.tobytes()))
+    else:
+        st.session_state["equity_fig"].data[0].y = equity
+    st.plotly_chart(st.session_state["equity_fig"], use_container_width=True)
+
+# -------------------------------------------------
+# TRADES + SCREENSHOT UPLOAD
+# -------------------------------------------------
+elif page == "Trades":
+    st.markdown("## Trades")
+
+    def _color_pnl(col):
+        return np.where(col.to_numpy() > 0,
+                        "color:#00ff9c", "color:#ff5c5c")
 
-    review = df[df["id"] == trade_id].iloc[0]
-    if review["screenshot"]:
-        st.image(review["screenshot"], use_column_width=True)
-    if review["notes"]:
-        st.info(review["notes"])
+    view = df.drop(columns="_sign")
+
+    if len(view) > 2000:
+        # the Styler renders per-cell HTML; skip it on huge journals
+        st.dataframe(view, use_container_width=True)
+    else:
+        st.dataframe(view.style.apply(_color_pnl, subset=["PnL"]),
+                     use_container_width=True)
+
+    render_screenshot_review(df)
 
 # -------------------------------------------------
 # ANALYTICS
 # -------------------------------------------------
 elif page == "Analytics":
     st.markdown("## Analytics")
-    fig = px.area(df, y="Drawdown")
-    fig.update_layout(
-        plot_bgcolor="#0e1117",
-        paper_bgcolor="#0e1117",
-        font_color="#c9d1d9"
+    if "drawdown_fig" not in st.session_state:
+        st.session_state["drawdown_fig"] = go.Figure(_drawdown_fig(drawdown.tobytes()))
+    else:
+        st.session_state["drawdown_fig"].data[0].y = drawdown
+    st.plotly_chart(st.session_state["drawdown_fig"], use_container_width=True)
+
+    st.markdown("### 📊 Pair Stats")
+
+    # built-in reducers only — keeps the groupby on the cython path
+    pair_stats = (
+        df.assign(win=(df["PnL"] > 0).astype("int8"))
+          .groupby("pair", observed=True)
+          .agg(Trades=("PnL", "count"),
+               WinSum=("win", "sum"),
+               NetPnL=("PnL", "sum"),
+               AvgRR=("RR", "mean"))
     )
-    st.plotly_chart(fig, use_container_width=True)
+    pair_stats["WinRate"] = (pair_stats["WinSum"] / pair_stats["Trades"] * 100).round(2)
+    pair_stats = pair_stats.drop(columns="WinSum")
+
+    st.dataframe(pair_stats, use_container_width=True)
+
+    st.markdown("### 🔁 Long vs Short")
+
+    is_long = df["_sign"].to_numpy() == 1
+    pnl_arr = df["PnL"].to_numpy()
+
+    c1, c2 = st.columns(2)
+    c1.metric("Long PnL", round(float(pnl_arr[is_long].sum()), 2))
+    c2.metric("Short PnL", round(float(pnl_arr[~is_long].sum()), 2))
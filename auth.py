@@ -1,5 +1,9 @@
+import streamlit as st
 import streamlit_authenticator as stauth
 
+# cache_resource: the bcrypt hashing below costs tens of ms per
+# credential and must not run on every rerun
+@st.cache_resource
 def get_authenticator():
 
     credentials = {
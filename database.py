@@ -6,7 +6,20 @@ DB_NAME = "trades.db"
 # GET CONNECTION
 # -------------------------------------------------
 def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+
+    # per-connection pragmas: only journal_mode persists in the file,
+    # so these must run on every handle that reads or writes, not
+    # just the setup connection. WAL + relaxed sync: one fsync per
+    # commit instead of two, and readers no longer block while a
+    # write is in flight
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
+
+    return conn
 
 
 # -------------------------------------------------
@@ -32,10 +45,67 @@ def create_table():
         screenshot TEXT,
         notes TEXT,
 
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+        pnl REAL GENERATED ALWAYS AS (
+            CASE WHEN direction = 'Buy'
+            THEN (takeprofit - entry) * lot
+            ELSE (entry - takeprofit) * lot END
+        ) VIRTUAL,
+        risk REAL GENERATED ALWAYS AS (ABS(entry - stoploss) * lot) VIRTUAL,
+        reward REAL GENERATED ALWAYS AS (ABS(takeprofit - entry) * lot) VIRTUAL,
+        rr REAL GENERATED ALWAYS AS (
+            CASE WHEN ABS(entry - stoploss) > 0
+            THEN ROUND(ABS(takeprofit - entry) / ABS(entry - stoploss), 2)
+            ELSE 0 END
+        ) VIRTUAL
     )
     """)
 
+    # upgrade path: DBs created before the generated columns existed
+    # are not touched by CREATE TABLE IF NOT EXISTS, so add the
+    # columns in place (SQLite allows ALTER TABLE ADD for VIRTUAL)
+    # table_xinfo, not table_info: only the former lists generated columns
+    existing = {row[1] for row in c.execute("PRAGMA table_xinfo(trades)")}
+
+    if "pnl" not in existing:
+        c.execute("""
+        ALTER TABLE trades ADD COLUMN pnl REAL GENERATED ALWAYS AS (
+            CASE WHEN direction = 'Buy'
+            THEN (takeprofit - entry) * lot
+            ELSE (entry - takeprofit) * lot END
+        ) VIRTUAL
+        """)
+    if "risk" not in existing:
+        c.execute("""
+        ALTER TABLE trades ADD COLUMN risk REAL
+        GENERATED ALWAYS AS (ABS(entry - stoploss) * lot) VIRTUAL
+        """)
+    if "reward" not in existing:
+        c.execute("""
+        ALTER TABLE trades ADD COLUMN reward REAL
+        GENERATED ALWAYS AS (ABS(takeprofit - entry) * lot) VIRTUAL
+        """)
+    if "rr" not in existing:
+        c.execute("""
+        ALTER TABLE trades ADD COLUMN rr REAL GENERATED ALWAYS AS (
+            CASE WHEN ABS(entry - stoploss) > 0
+            THEN ROUND(ABS(takeprofit - entry) / ABS(entry - stoploss), 2)
+            ELSE 0 END
+        ) VIRTUAL
+        """)
+
+    # composite index serves plain username filters via its prefix
+    # and the ORDER BY created_at in get_user_trades; ANALYZE teaches
+    # the planner to use it. The old single-column index is dropped
+    # so inserts only maintain one index
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_trades_user_created
+    ON trades(username, created_at)
+    """)
+    c.execute("DROP INDEX IF EXISTS idx_trades_username")
+    c.execute("ANALYZE")
+
     conn.commit()
     conn.close()
 
@@ -109,6 +179,28 @@ def get_user_trades(username):
     return rows
 
 
+# -------------------------------------------------
+# GET USER METRICS (AGGREGATED IN SQL)
+# -------------------------------------------------
+def get_user_metrics(username):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*),
+            SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END),
+            AVG(rr),
+            SUM(pnl)
+        FROM trades WHERE username = ?
+        """,
+        (username,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
 # -------------------------------------------------
 # DELETE TRADE (OPTIONAL)
 # -------------------------------------------------